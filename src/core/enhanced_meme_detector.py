@@ -6,16 +6,146 @@
 """
 
 import pandas as pd
-import re
+import numpy as np
 import json
-from collections import defaultdict, Counter
+from collections import Counter
+from dataclasses import dataclass
 from datetime import datetime
 import requests
 import time
 
+try:
+    from joblib import Parallel, delayed
+except ImportError:  # joblib为可选依赖，缺失时退化为串行扫描
+    Parallel = None
+
+try:
+    import orjson
+except ImportError:  # orjson为可选依赖，缺失时使用标准库json
+    orjson = None
+
+try:
+    import hyperscan
+except ImportError:  # hyperscan为可选依赖（需要Intel Hyperscan库），缺失时逐meme扫描
+    hyperscan = None
+
+# 情感信号词
+POSITIVE_WORDS = ('moon', 'rocket', 'gem', 'bullish', 'pump')
+NEGATIVE_WORDS = ('dump', 'bearish', 'fud', 'rug')
+
+
+def _scan_known_meme(search_terms, texts_lower):
+    """扫描全部推文，统计单个已知meme币的命中情况
+
+    每个meme互相独立，可在子进程中并行执行。返回命中行号、对应命中词
+    以及正/负面情感信号计数。
+    """
+    hit_rows = []
+    matched_terms = []
+    positive_signals = 0
+    negative_signals = 0
+    
+    for i, text in enumerate(texts_lower):
+        for term in search_terms:
+            if term in text:
+                hit_rows.append(i)
+                matched_terms.append(term)
+                if any(word in text for word in POSITIVE_WORDS):
+                    positive_signals += 1
+                if any(word in text for word in NEGATIVE_WORDS):
+                    negative_signals += 1
+                break
+    
+    return hit_rows, matched_terms, positive_signals, negative_signals
+
+
+@dataclass(frozen=True)
+class MemeInfo:
+    """已知meme币的检索元数据，小写形式在构建时预先计算"""
+    __slots__ = ('key', 'symbol', 'symbol_lower', 'name_lower', 'search_terms')
+    
+    key: str
+    symbol: str
+    symbol_lower: str
+    name_lower: str
+    search_terms: tuple
+
+
+def _hs_literal(term):
+    """把普通字符串转成Hyperscan字面量表达式（非字母数字字节按\\xHH转义）"""
+    return b''.join(
+        bytes([c]) if chr(c).isalnum() and c < 128 else b'\\x%02x' % c
+        for c in term.encode('utf-8')
+    )
+
+
+def _scan_known_memes_hyperscan(tasks, texts_lower):
+    """用Hyperscan多模式DFA一次扫描全部推文
+
+    所有meme的搜索词和情感信号词编译进同一个数据库，每条推文只扫描一遍。
+    返回与逐个调用_scan_known_meme相同格式的结果列表。
+    """
+    expressions = []
+    term_ids = []  # 每个meme按搜索词顺序对应的表达式id
+    for search_terms in tasks:
+        ids = []
+        for term in search_terms:
+            ids.append(len(expressions))
+            expressions.append(_hs_literal(term))
+        term_ids.append(ids)
+    
+    positive_ids = set(range(len(expressions), len(expressions) + len(POSITIVE_WORDS)))
+    expressions.extend(_hs_literal(word) for word in POSITIVE_WORDS)
+    negative_ids = set(range(len(expressions), len(expressions) + len(NEGATIVE_WORDS)))
+    expressions.extend(_hs_literal(word) for word in NEGATIVE_WORDS)
+    
+    db = hyperscan.Database()
+    db.compile(
+        expressions=expressions,
+        ids=list(range(len(expressions))),
+        elements=len(expressions),
+        flags=[hyperscan.HS_FLAG_SINGLEMATCH] * len(expressions)
+    )
+    
+    hit_rows = [[] for _ in tasks]
+    matched_terms = [[] for _ in tasks]
+    positive_counts = [0] * len(tasks)
+    negative_counts = [0] * len(tasks)
+    hits = set()
+    
+    def on_match(expr_id, start, end, flags, context):
+        hits.add(expr_id)
+    
+    for i, text in enumerate(texts_lower):
+        hits.clear()
+        db.scan(text.encode('utf-8'), match_event_handler=on_match)
+        if not hits:
+            continue
+        
+        is_positive = not hits.isdisjoint(positive_ids)
+        is_negative = not hits.isdisjoint(negative_ids)
+        for t, ids in enumerate(term_ids):
+            for order, expr_id in enumerate(ids):
+                # 与逐词查找保持一致：取搜索词顺序中第一个命中的词
+                if expr_id in hits:
+                    hit_rows[t].append(i)
+                    matched_terms[t].append(tasks[t][order])
+                    positive_counts[t] += is_positive
+                    negative_counts[t] += is_negative
+                    break
+    
+    return list(zip(hit_rows, matched_terms, positive_counts, negative_counts))
+
+
 class EnhancedMemeDetector:
-    def __init__(self):
-        """初始化增强版Meme检测器"""
+    def __init__(self, n_jobs=-1):
+        """初始化增强版Meme检测器
+
+        Args:
+            n_jobs: 已知meme币并行扫描的进程数，-1表示使用全部CPU
+        """
+        
+        self.n_jobs = n_jobs
         
         # 扩展的meme币数据库
         self.meme_database = {
@@ -158,6 +288,19 @@ class EnhancedMemeDetector:
             }
         }
         
+        # 检索用元数据，热循环中直接访问属性而不是反复查嵌套dict并小写
+        self.memes = tuple(
+            MemeInfo(
+                key=key,
+                symbol=info['symbol'],
+                symbol_lower=info['symbol'].lower(),
+                name_lower=info['name'].lower(),
+                search_terms=(key, info['symbol'].lower(), info['name'].lower())
+            )
+            for key, info in self.meme_database.items()
+        )
+        self.known_symbols = frozenset(meme.symbol for meme in self.memes)
+        
         # 扩展搜索模式
         self.search_patterns = {
             # 直接代币符号
@@ -187,8 +330,10 @@ class EnhancedMemeDetector:
         print(f"加载了 {len(self.tweets_df)} 条推文")
         
         # 数据清理
-        self.tweets_df = self.tweets_df.dropna(subset=['text'])
+        self.tweets_df = self.tweets_df.dropna(subset=['text']).reset_index(drop=True)
         self.tweets_df['text'] = self.tweets_df['text'].astype(str)
+        # user_id大量重复，转为分类类型后去重/分组只需处理整数编码
+        self.tweets_df['user_id'] = self.tweets_df['user_id'].astype('category')
         
     def detect_enhanced_memes(self):
         """增强版meme检测"""
@@ -215,37 +360,44 @@ class EnhancedMemeDetector:
         
         known_results = {}
         
-        for meme_key, meme_info in self.meme_database.items():
-            mentions = []
-            contexts = []
-            
-            # 搜索meme名称和符号
-            search_terms = [meme_key, meme_info['symbol'].lower(), meme_info['name'].lower()]
-            
-            for _, row in self.tweets_df.iterrows():
-                text = row['text'].lower()
+        # 统一小写一次，供所有meme复用
+        texts_lower = self.tweets_df['text'].str.lower().tolist()
+        
+        # 预过滤：在拼接后的全文上做一次C级子串查找，任何搜索词都未出现的meme直接跳过，
+        # 只对剩余候选做逐条推文扫描（换行分隔，搜索词不含换行，不会跨推文误命中）
+        corpus = '\n'.join(texts_lower)
+        candidates = [
+            meme for meme in self.memes
+            if any(term in corpus for term in meme.search_terms)
+        ]
+        tasks = [meme.search_terms for meme in candidates]
+        
+        # 优先用Hyperscan一次扫描全部meme；否则每个meme一个任务，互不依赖，按CPU并行
+        if hyperscan is not None and tasks:
+            scan_results = _scan_known_memes_hyperscan(tasks, texts_lower)
+        elif Parallel is not None and self.n_jobs != 1:
+            scan_results = Parallel(n_jobs=self.n_jobs, backend='loky')(
+                delayed(_scan_known_meme)(search_terms, texts_lower) for search_terms in tasks
+            )
+        else:
+            scan_results = [_scan_known_meme(search_terms, texts_lower) for search_terms in tasks]
+        
+        user_ids = self.tweets_df['user_id'].tolist()
+        user_codes = self.tweets_df['user_id'].cat.codes.to_numpy()
+        
+        for meme, (hit_rows, matched_terms, positive_signals, negative_signals) in zip(candidates, scan_results):
+            if hit_rows:
+                mentions = [
+                    {'tweet_idx': i, 'user_id': user_ids[i], 'matched_term': term}
+                    for i, term in zip(hit_rows, matched_terms)
+                ]
                 
-                for term in search_terms:
-                    if term in text:
-                        mentions.append({
-                            'user_id': row['user_id'],
-                            'text': row['text'][:200],
-                            'timestamp': row.get('created_at', 'unknown'),
-                            'matched_term': term
-                        })
-                        contexts.append(text)
-                        break
-            
-            if mentions:
                 # 计算热度分数
                 mention_count = len(mentions)
-                unique_users = len(set(m['user_id'] for m in mentions))
+                unique_users = len(np.unique(user_codes[hit_rows]))
                 
                 # 分析上下文情感
-                positive_signals = sum(1 for ctx in contexts if any(word in ctx for word in ['moon', 'rocket', 'gem', 'bullish', 'pump']))
-                negative_signals = sum(1 for ctx in contexts if any(word in ctx for word in ['dump', 'bearish', 'fud', 'rug']))
-                
-                sentiment_score = (positive_signals - negative_signals) / len(contexts) if contexts else 0
+                sentiment_score = (positive_signals - negative_signals) / mention_count
                 
                 # 综合评分
                 total_score = (
@@ -254,8 +406,8 @@ class EnhancedMemeDetector:
                     sentiment_score * 100 * 0.3
                 )
                 
-                known_results[meme_key] = {
-                    **meme_info,
+                known_results[meme.key] = {
+                    **self.meme_database[meme.key],
                     'mention_count': mention_count,
                     'unique_users': unique_users,
                     'sentiment_score': sentiment_score,
@@ -272,35 +424,37 @@ class EnhancedMemeDetector:
         print("发现潜在新meme币...")
         
         potential_results = {}
-        token_mentions = defaultdict(list)
         
-        # 使用正则表达式查找$符号代币
-        for _, row in self.tweets_df.iterrows():
-            text = row['text']
-            
-            # 查找$符号代币
-            matches = re.findall(self.search_patterns['token_symbols'], text)
-            for match in matches:
-                if len(match) >= 2 and len(match) <= 10:  # 合理的代币符号长度
-                    token_mentions[match.upper()].append({
-                        'user_id': row['user_id'],
-                        'text': text[:200],
-                        'timestamp': row.get('created_at', 'unknown')
-                    })
+        # 使用正则表达式一次性提取全部$符号代币，结果按列存放：
+        # 每个命中只是 (token, tweet_idx, user_id) 一行，而不是一个dict
+        extracted = self.tweets_df['text'].str.extractall(self.search_patterns['token_symbols'])
+        tweet_idx = extracted.index.get_level_values(0).to_numpy()
+        matches = pd.DataFrame({
+            'token': extracted[0].str.upper().to_numpy(),
+            'tweet_idx': tweet_idx,
+            'user_id': self.tweets_df['user_id'].iloc[tweet_idx].to_numpy()
+        })
+        
+        grouped = matches.groupby('token', sort=False)  # 保持首次出现顺序
+        token_stats = grouped.agg(
+            mention_count=('tweet_idx', 'size'),
+            unique_users=('user_id', 'nunique')
+        )
+        token_rows = grouped.indices
+        
+        texts = self.tweets_df['text']
+        mainstream_tokens = {'BTC', 'ETH', 'SOL', 'ADA', 'DOT', 'LINK', 'UNI', 'AAVE', 'USDT', 'USDC'}
         
         # 过滤和评分
-        for token, mentions in token_mentions.items():
-            mention_count = len(mentions)
-            unique_users = len(set(m['user_id'] for m in mentions))
-            
+        for token, mention_count, unique_users in token_stats.itertuples(name=None):
             # 只考虑有一定讨论量的代币
             if mention_count >= 3 and unique_users >= 2:
                 # 检查是否是已知主流币
-                mainstream_tokens = {'BTC', 'ETH', 'SOL', 'ADA', 'DOT', 'LINK', 'UNI', 'AAVE', 'USDT', 'USDC'}
-                if token not in mainstream_tokens and token not in [info['symbol'] for info in self.meme_database.values()]:
+                if token not in mainstream_tokens and token not in self.known_symbols:
                     
                     # 分析上下文
-                    contexts = [m['text'].lower() for m in mentions]
+                    rows = matches.iloc[token_rows[token]]
+                    contexts = [texts.iat[i][:200].lower() for i in rows['tweet_idx']]
                     
                     # meme特征检测
                     meme_signals = sum(1 for ctx in contexts if any(word in ctx for word in [
@@ -333,7 +487,10 @@ class EnhancedMemeDetector:
                             'meme_signals': meme_signals,
                             'community_signals': community_signals,
                             'total_score': potential_score,
-                            'sample_mentions': mentions[:5],
+                            'sample_mentions': [
+                                {'tweet_idx': i, 'user_id': uid}
+                                for i, uid in zip(rows['tweet_idx'][:5].tolist(), rows['user_id'][:5].tolist())
+                            ],
                             'detection_type': 'potential_meme'
                         }
         
@@ -380,6 +537,19 @@ class EnhancedMemeDetector:
         
         return enhanced
     
+    def _materialize_mention(self, mention):
+        """根据行号补全提及记录的文本和时间"""
+        idx = mention['tweet_idx']
+        timestamp = self.tweets_df['created_at'].iat[idx] if 'created_at' in self.tweets_df.columns else 'unknown'
+        record = {
+            'user_id': mention['user_id'],
+            'text': self.tweets_df['text'].iat[idx][:200],
+            'timestamp': timestamp.item() if hasattr(timestamp, 'item') else timestamp  # numpy标量转原生类型
+        }
+        if 'matched_term' in mention:
+            record['matched_term'] = mention['matched_term']
+        return record
+    
     def print_enhanced_summary(self):
         """打印增强版摘要"""
         if not self.detected_memes:
@@ -409,16 +579,26 @@ class EnhancedMemeDetector:
             print(f"    Meme信号: {data['meme_signals']} | 社区信号: {data['community_signals']}")
             print(f"    潜力分数: {data['total_score']:.1f}")
             if data['sample_mentions']:
-                print(f"    示例: {data['sample_mentions'][0]['text'][:100]}...")
+                sample = self._materialize_mention(data['sample_mentions'][0])
+                print(f"    示例: {sample['text'][:100]}...")
             print()
     
     def save_enhanced_results(self, filename='enhanced_meme_detection_results.json'):
         """保存增强版结果"""
         print(f"保存结果到 {filename}...")
         
+        # 示例提及只存了行号，保存前补全文本
+        detected_memes = {
+            meme_key: {
+                **data,
+                'sample_mentions': [self._materialize_mention(m) for m in data['sample_mentions']]
+            }
+            for meme_key, data in self.detected_memes.items()
+        }
+        
         save_data = {
             'detection_timestamp': datetime.now().isoformat(),
-            'detected_memes': self.detected_memes,
+            'detected_memes': detected_memes,
             'summary': {
                 'total_memes': len(self.detected_memes),
                 'known_memes': len([m for m in self.detected_memes.values() if m['detection_type'] == 'known_meme']),
@@ -428,8 +608,16 @@ class EnhancedMemeDetector:
             }
         }
         
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(save_data, f, ensure_ascii=False, indent=2, default=str)
+        if orjson is not None:
+            with open(filename, 'wb') as f:
+                f.write(orjson.dumps(
+                    save_data,
+                    option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+                    default=str
+                ))
+        else:
+            with open(filename, 'w', encoding='utf-8') as f:
+                json.dump(save_data, f, ensure_ascii=False, indent=2, default=str)
         
         print(f"结果已保存到 {filename}")
 
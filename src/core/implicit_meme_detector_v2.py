@@ -11,22 +11,33 @@ from collections import defaultdict, Counter
 import json
 from datetime import datetime
 
+try:
+    import orjson
+except ImportError:  # orjson为可选依赖，缺失时使用标准库json
+    orjson = None
+
+# 项目模式中唯一可能出现的非单词字符是前缀符号，translate比re.sub快得多
+_STRIP_TABLE = str.maketrans('', '', '$#@')
+
 class ImplicitMemeDetectorV2:
     def __init__(self):
         """初始化隐性Meme检测器 V2"""
         
         # 已知的主流meme币 - 这些不是隐性的
-        self.known_memes = {
+        self.known_memes = frozenset({
             'doge', 'shib', 'shiba', 'pepe', 'floki', 'bonk', 'wojak', 'chad', 'virgin',
             'cat', 'monkey', 'ape', 'frog', 'bird', 'fish', 'turtle', 'hamster', 'rabbit'
-        }
+        })
         
         # 主流项目黑名单
-        self.mainstream_blacklist = {
+        self.mainstream_blacklist = frozenset({
             'bitcoin', 'btc', 'ethereum', 'eth', 'cardano', 'ada', 'solana', 'sol',
             'polkadot', 'dot', 'chainlink', 'link', 'uniswap', 'uni', 'aave',
             'ai', 'blockchain', 'defi', 'nft'
-        }
+        })
+        
+        # 主流项目和已知meme币合并为一次查找
+        self._excluded = self.mainstream_blacklist | self.known_memes
         
         # 新兴meme币特征词汇
         self.emerging_indicators = [
@@ -83,14 +94,14 @@ class ImplicitMemeDetectorV2:
         """挖掘潜在项目名称"""
         print("挖掘潜在项目名称...")
         
-        # 项目名称模式
-        project_patterns = [
+        # 项目名称模式（预编译）
+        project_patterns = [re.compile(pattern) for pattern in (
             r'\$[A-Za-z]+',  # $符号开头的项目
             r'#[A-Za-z]+',    # #标签项目
             r'@[A-Za-z0-9_]+', # @提及的项目
             r'\b[A-Z][a-z]+[A-Z][a-z]+\b',  # 驼峰命名的项目
             r'\b[A-Z]{2,}\b',  # 全大写项目
-        ]
+        )]
         
         potential_projects = defaultdict(int)
         project_contexts = defaultdict(list)
@@ -100,15 +111,16 @@ class ImplicitMemeDetectorV2:
             user_id = row['user_id']
             
             for pattern in project_patterns:
-                matches = re.findall(pattern, text)
-                for match in matches:
+                for m in pattern.finditer(text):
+                    match = m.group()
                     # 清理匹配结果
                     clean_match = self._clean_project_name(match)
                     if clean_match and len(clean_match) >= 2:
                         potential_projects[clean_match] += 1
                         
-                        # 记录上下文
-                        context = text[max(0, text.find(match)-50):text.find(match)+len(match)+50]
+                        # 记录上下文，直接使用匹配位置而不是重新查找
+                        start, end = m.span()
+                        context = text[max(0, start-50):end+50]
                         project_contexts[clean_match].append({
                             'user_id': user_id,
                             'original_match': match,
@@ -122,7 +134,7 @@ class ImplicitMemeDetectorV2:
     def _clean_project_name(self, name):
         """清理项目名称"""
         # 移除符号
-        clean_name = re.sub(r'[^\w]', '', name)
+        clean_name = name.translate(_STRIP_TABLE)
         
         # 过滤太短或太长的名称
         if len(clean_name) < 2 or len(clean_name) > 20:
@@ -132,15 +144,12 @@ class ImplicitMemeDetectorV2:
         if clean_name.isdigit():
             return None
             
-        # 过滤已知的主流项目
-        if clean_name.lower() in self.mainstream_blacklist:
-            return None
-            
-        # 过滤已知的meme币
-        if clean_name.lower() in self.known_memes:
+        # 过滤已知的主流项目和meme币
+        clean_lower = clean_name.lower()
+        if clean_lower in self._excluded:
             return None
             
-        return clean_name.lower()
+        return clean_lower
     
     def _analyze_project_discussion(self, potential_projects):
         """分析项目讨论热度"""
@@ -294,8 +303,16 @@ class ImplicitMemeDetectorV2:
             }
         }
         
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(save_data, f, ensure_ascii=False, indent=2, default=str)
+        if orjson is not None:
+            with open(filename, 'wb') as f:
+                f.write(orjson.dumps(
+                    save_data,
+                    option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+                    default=str
+                ))
+        else:
+            with open(filename, 'w', encoding='utf-8') as f:
+                json.dump(save_data, f, ensure_ascii=False, indent=2, default=str)
         
         print(f"结果已保存到 {filename}")
 
@@ -5,15 +5,81 @@ Meme识别系统 V2 - 重新设计
 专注于识别真正的meme币，而不是主流项目
 """
 
+import numpy as np
 import pandas as pd
 import re
-from collections import defaultdict
+import random
+import heapq
+from collections import defaultdict, Counter
 import json
 from datetime import datetime
 
+try:
+    from joblib import Parallel, delayed, effective_n_jobs
+except ImportError:  # joblib为可选依赖，缺失时退化为串行扫描
+    Parallel = None
+
+try:
+    import ahocorasick
+except ImportError:  # pyahocorasick为可选依赖，缺失时逐类做子串查找
+    ahocorasick = None
+
+try:
+    import orjson
+except ImportError:  # orjson为可选依赖，缺失时使用标准库json
+    orjson = None
+
+try:
+    import pyarrow
+    import pyarrow.csv
+except ImportError:  # pyarrow为可选依赖，缺失时使用pandas自带的C解析引擎分块读取
+    pyarrow = None
+
+try:
+    import hyperscan
+except ImportError:  # hyperscan为可选依赖（需要Intel Hyperscan库），缺失时使用re逐条匹配
+    hyperscan = None
+
+
+def _hs_literal(term):
+    """把普通字符串转成Hyperscan字面量表达式（非字母数字字节按\\xHH转义）"""
+    return b''.join(
+        bytes([c]) if chr(c).isalnum() and c < 128 else b'\\x%02x' % c
+        for c in term.encode('utf-8')
+    )
+
+
+def _count_hit(expr_id, start, end, flags, hits):
+    """Hyperscan命中回调：按表达式id计数"""
+    hits[expr_id] += 1
+
+
+def _extract_keyword_hits(texts_lower, keyword_re):
+    """用合并正则在整列推文上一次性匹配，返回命中表(row, keyword, hits)，row为推文在本列中的位置"""
+    extracted = texts_lower.reset_index(drop=True).str.extractall(keyword_re)
+    found = pd.DataFrame({
+        'row': extracted.index.get_level_values(0),
+        'keyword': extracted[0].to_numpy(dtype=object)
+    })
+    return found.groupby(['row', 'keyword'], sort=False).size().rename('hits').reset_index()
+
+
 class MemeDetectorV2:
-    def __init__(self):
-        """初始化Meme检测器 V2"""
+    def __init__(self, n_jobs=-1, random_seed=None):
+        """初始化Meme检测器 V2
+
+        Args:
+            n_jobs: 无Hyperscan时推文扫描的并行进程数，-1表示使用全部CPU
+            random_seed: 上下文蓄水池抽样的随机种子，None表示不固定
+        """
+        
+        self.n_jobs = n_jobs
+        # 每个meme最多保留的上下文条数，超出部分按蓄水池抽样均匀保留；
+        # 评分只用上下文总数，单独计数，不受抽样影响
+        self.max_contexts = 50
+        self._context_rng = random.Random(random_seed)
+        # 每个分片至少包含的推文数，数据块较小时串行扫描，避免进程开销超过收益
+        self.min_shard_size = 20000
         
         # 重新定义meme关键词库 - 专注于真正的meme币
         self.meme_keywords = {
@@ -42,31 +108,130 @@ class MemeDetectorV2:
         }
         
         # 主流项目黑名单 - 这些不是meme
-        self.mainstream_blacklist = {
+        self.mainstream_blacklist = frozenset({
             'bitcoin', 'btc', 'ethereum', 'eth', 'cardano', 'ada', 'solana', 'sol',
             'polkadot', 'dot', 'chainlink', 'link', 'uniswap', 'uni', 'aave',
             'ai', 'artificial intelligence', 'machine learning', 'blockchain',
             'defi', 'decentralized finance', 'nft', 'non fungible token'
+        })
+        
+        # 关键词 -> 所属类别元组（按类别和关键词的声明顺序）
+        # wojak/chad/virgin、moon/rocket等同时出现在多个类别中的关键词只保留一份，
+        # 扫描时每个关键词只匹配一次，命中后每个所属类别各计一次；
+        # 黑名单中的主流项目在这里就排除，不进入正则和Hyperscan数据库，也不会被计数
+        keyword_categories = {}
+        for category, keywords in self.meme_keywords.items():
+            for keyword in keywords:
+                if keyword.lower() in self.mainstream_blacklist:
+                    continue
+                categories = keyword_categories.setdefault(keyword, [])
+                if category not in categories:
+                    categories.append(category)
+        self._keyword_categories = {
+            keyword: tuple(categories) for keyword, categories in keyword_categories.items()
+        }
+        # 关键词首次声明的位置，用于按原遍历顺序处理同一推文中的命中
+        self._keyword_rank = {keyword: i for i, keyword in enumerate(self._keyword_categories)}
+        # 每次命中按所属类别数计入提及次数
+        self._keyword_weight = {keyword: len(categories) for keyword, categories in self._keyword_categories.items()}
+        # 所有关键词合并为一个完整单词匹配的正则，长词优先
+        self._keyword_re = re.compile(
+            r'\b(' + '|'.join(map(re.escape, sorted(self._keyword_categories, key=len, reverse=True))) + r')\b'
+        )
+        # 同一批关键词编译为Hyperscan多模式数据库（可选）
+        self._keyword_list = tuple(self._keyword_categories)
+        self._keyword_db = self._build_keyword_db(self._keyword_list)
+        
+        # meme特征加成的关键词类别：经典meme币、动物名称、网络文化、表情包元素
+        self._bonus_keywords = (
+            ('doge', 'shib', 'pepe', 'floki', 'bonk'),
+            ('cat', 'dog', 'monkey', 'ape', 'frog'),
+            ('wojak', 'chad', 'virgin', 'simp', 'incel'),
+            ('moon', 'rocket', 'fire', 'based', 'cringe')
+        )
+        # 所有加成关键词合并为一个Aho-Corasick自动机（可选），一次扫描名称得到命中的类别
+        self._bonus_automaton = self._build_bonus_automaton(self._bonus_keywords)
+        # meme名称只会是关键词本身，特征加成在初始化时按关键词一次算好，评分时直接查表
+        self._keyword_bonus = {
+            keyword: self._calculate_meme_bonus(keyword, None) for keyword in self._keyword_categories
         }
         
         self.detected_memes = {}
         
-    def load_data(self, tweets_file):
-        """加载推文数据"""
+    def load_data(self, tweets_file, chunksize=100000, block_size=64 << 20):
+        """设置推文数据源
+
+        推文在检测时分块流式读取并逐块累加计数，不会整体载入内存。
+        有pyarrow时按block_size字节分块多线程解析，否则用pandas按chunksize条分块。
+        """
         print("加载推文数据...")
         
-        # 分块读取
-        self.tweets_df = pd.read_csv(tweets_file, chunksize=10000)
-        tweets_list = []
-        for chunk in self.tweets_df:
-            tweets_list.append(chunk)
-        
-        self.tweets_df = pd.concat(tweets_list, ignore_index=True)
-        print(f"加载了 {len(self.tweets_df)} 条推文")
-        
-        # 数据清理
-        self.tweets_df = self.tweets_df.dropna(subset=['text'])
-        self.tweets_df['text'] = self.tweets_df['text'].astype(str)
+        self.tweets_file = tweets_file
+        self.chunksize = chunksize
+        self.block_size = block_size
+        if pyarrow is not None:
+            print(f"将分块读取推文: {tweets_file} (每块 {block_size >> 20} MB)")
+        else:
+            print(f"将分块读取推文: {tweets_file} (每块 {chunksize} 条)")
+        
+    def _iter_tweet_chunks(self):
+        """逐块读取并清理推文数据"""
+        # 只解析用到的列；正文直接按字符串类型读入，
+        # 用户ID重复度高，按category读入，每个不同ID只存一份字符串
+        if pyarrow is None:
+            reader = pd.read_csv(
+                self.tweets_file,
+                chunksize=self.chunksize,
+                usecols=lambda column: column in ('text', 'user_id', 'created_at'),
+                dtype={'text': 'string', 'user_id': 'category'}
+            )
+        else:
+            reader = self._iter_arrow_chunks()
+        
+        for chunk in reader:
+            # 数据清理
+            yield self._numeric_user_ids(chunk.dropna(subset=['text']))
+    
+    @staticmethod
+    def _numeric_user_ids(chunk):
+        """用户ID全为数字时把category的类别换成整数
+        
+        类别只有不同ID的个数，转换开销很小；保存的上下文中user_id仍是数字，与按int读取整列时的结果文件一致
+        """
+        if 'user_id' not in chunk.columns:
+            return chunk
+        user_ids = chunk['user_id']
+        try:
+            user_ids = user_ids.cat.rename_categories(user_ids.cat.categories.astype('int64'))
+        except (ValueError, TypeError, OverflowError):
+            return chunk  # 含非数字ID（或转换后重复），保持字符串
+        return chunk.assign(user_id=user_ids)
+    
+    def _iter_arrow_chunks(self):
+        """用pyarrow.csv流式读取推文，每个RecordBatch转为一个DataFrame
+        
+        推文正文可能跨行，需要newlines_in_values；流式读取只按首块推断类型，
+        因此文本和用户ID显式指定类型，用户ID字典编码后即为category列。
+        """
+        header = pd.read_csv(self.tweets_file, nrows=0).columns
+        columns = [column for column in ('text', 'user_id', 'created_at') if column in header]
+        
+        reader = pyarrow.csv.open_csv(
+            self.tweets_file,
+            read_options=pyarrow.csv.ReadOptions(block_size=self.block_size),
+            parse_options=pyarrow.csv.ParseOptions(newlines_in_values=True),
+            convert_options=pyarrow.csv.ConvertOptions(
+                include_columns=columns,
+                column_types={
+                    'text': pyarrow.string(),
+                    'user_id': pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+                },
+                # 与pandas一致，空字符串视为缺失值
+                strings_can_be_null=True
+            )
+        )
+        for batch in reader:
+            yield batch.to_pandas(types_mapper={pyarrow.string(): pd.StringDtype()}.get)
         
     def detect_memes(self):
         """检测真正的Meme"""
@@ -91,37 +256,149 @@ class MemeDetectorV2:
         """识别潜在meme"""
         print("识别潜在meme...")
         
-        meme_counts = defaultdict(int)
+        meme_counts = {}
         meme_contexts = defaultdict(list)
-        meme_categories = defaultdict(set)
+        meme_context_totals = Counter()
+        total_tweets = 0
         
-        for idx, row in self.tweets_df.iterrows():
-            text = row['text'].lower()
-            user_id = row['user_id']
-            
-            # 遍历所有meme关键词
-            for category, keywords in self.meme_keywords.items():
-                for keyword in keywords:
-                    # 使用正则表达式匹配完整单词
-                    pattern = r'\b' + re.escape(keyword) + r'\b'
-                    matches = re.findall(pattern, text)
-                    
-                    if matches:
-                        meme_name = keyword
-                        meme_counts[meme_name] += len(matches)
-                        meme_categories[meme_name].add(category)
-                        
-                        # 记录上下文
-                        context = text[max(0, text.find(keyword)-30):text.find(keyword)+len(keyword)+30]
-                        meme_contexts[meme_name].append({
-                            'user_id': user_id,
-                            'context': context.strip(),
-                            'timestamp': row.get('created_at', 'unknown'),
-                            'category': category
-                        })
+        # 逐块扫描并累加，块按文件顺序处理，保持关键词的首次出现顺序
+        for chunk in self._iter_tweet_chunks():
+            total_tweets += len(chunk)
+            self._scan_chunk(chunk, meme_counts, meme_contexts, meme_context_totals)
         
+        meme_categories = {keyword: self._keyword_categories[keyword] for keyword in meme_counts}
+        
+        print(f"处理了 {total_tweets} 条推文")
         print(f"识别出 {len(meme_counts)} 个潜在meme")
-        return {'counts': meme_counts, 'contexts': meme_contexts, 'categories': meme_categories}
+        return {
+            'counts': meme_counts,
+            'contexts': meme_contexts,
+            'context_totals': meme_context_totals,
+            'categories': meme_categories
+        }
+    
+    @staticmethod
+    def _build_keyword_db(keywords):
+        """把全部关键词编译进一个Hyperscan数据库，表达式id即关键词下标"""
+        if hyperscan is None:
+            return None
+        
+        expressions = [b'\\b' + _hs_literal(keyword) + b'\\b' for keyword in keywords]
+        db = hyperscan.Database()
+        db.compile(
+            expressions=expressions,
+            ids=list(range(len(expressions))),
+            elements=len(expressions),
+            flags=[0] * len(expressions)
+        )
+        return db
+    
+    def _scan_chunk(self, chunk, meme_counts, meme_contexts, meme_context_totals):
+        """扫描一块推文，把提及次数、上下文样本和上下文总数累加到对应字典中"""
+        texts_lower = chunk['text'].str.lower()
+        
+        # 1. 找出每条推文命中的关键词及次数：(推文位置, 关键词, 命中次数)
+        matches = self._match_keywords(texts_lower)
+        
+        # 按推文顺序、同一推文内按关键词声明顺序排列，与逐条逐词遍历的首次出现顺序一致
+        matches['rank'] = matches['keyword'].map(self._keyword_rank)
+        matches = matches.sort_values(['row', 'rank'], kind='stable')
+        
+        # 2. 提及次数：每个关键词在其所属的每个类别中各计一次，整列聚合
+        matches['weighted_hits'] = matches['hits'] * matches['keyword'].map(self._keyword_weight)
+        chunk_counts = matches.groupby('keyword', sort=False)['weighted_hits'].sum()
+        for keyword, count in zip(chunk_counts.index, chunk_counts.tolist()):
+            meme_counts[keyword] = meme_counts.get(keyword, 0) + count
+        
+        # 3. 上下文只为命中的(推文, 关键词)对提取，窗口取该关键词第一个完整单词匹配的位置
+        texts = texts_lower.tolist()
+        user_ids = chunk['user_id'].tolist()
+        if 'created_at' in chunk.columns:
+            timestamps = chunk['created_at'].tolist()
+        else:
+            timestamps = ['unknown'] * len(texts)
+        
+        current_row, spans = None, {}
+        for row, keyword in zip(matches['row'].tolist(), matches['keyword'].tolist()):
+            text = texts[row]
+            meme_name = keyword
+            if row != current_row:
+                # 每条命中推文只用合并正则扫描一遍，记下各关键词首次匹配的起止位置
+                current_row, spans = row, {}
+                for match in self._keyword_re.finditer(text):
+                    spans.setdefault(match.group(1), match.span())
+            
+            # 记录上下文
+            start, end = spans[keyword]
+            context = text[max(0, start-30):end+30]
+            
+            for category in self._keyword_categories[keyword]:
+                self._sample_context(meme_contexts[meme_name], meme_context_totals, meme_name, {
+                    'user_id': user_ids[row],
+                    'context': context.strip(),
+                    'timestamp': timestamps[row],
+                    'category': category
+                })
+    
+    def _sample_context(self, sample, meme_context_totals, meme_name, context):
+        """蓄水池抽样（Algorithm R）：上下文总数照常累加，样本最多保留max_contexts条"""
+        meme_context_totals[meme_name] += 1
+        if len(sample) < self.max_contexts:
+            sample.append(context)
+            return
+        j = self._context_rng.randrange(meme_context_totals[meme_name])
+        if j < self.max_contexts:
+            sample[j] = context
+    
+    def _match_keywords(self, texts_lower):
+        """返回命中表DataFrame：row为推文位置，keyword为关键词，hits为该推文中的命中次数
+        
+        有Hyperscan时逐条扫描；否则用str.extractall在pandas内整列匹配再分组计数，大块时分片并行。
+        """
+        if self._keyword_db is None:
+            return self._match_keywords_regex(texts_lower.reset_index(drop=True))
+        
+        rows, keywords, counts = [], [], []
+        for row, text in enumerate(texts_lower.tolist()):
+            for keyword, count in self._find_keywords(text).items():
+                rows.append(row)
+                keywords.append(keyword)
+                counts.append(count)
+        return pd.DataFrame({'row': rows, 'keyword': keywords, 'hits': counts})
+    
+    def _match_keywords_regex(self, texts_lower):
+        """正则路径：推文之间互不依赖，数据块足够大时按位置切成连续分片并行扫描"""
+        n_shards = 1
+        if Parallel is not None and self.n_jobs != 1:
+            n_shards = min(effective_n_jobs(self.n_jobs), len(texts_lower) // self.min_shard_size)
+        if n_shards <= 1:
+            return _extract_keyword_hits(texts_lower, self._keyword_re)
+        
+        bounds = [len(texts_lower) * i // n_shards for i in range(n_shards + 1)]
+        shard_results = Parallel(n_jobs=n_shards, backend='loky')(
+            delayed(_extract_keyword_hits)(texts_lower.iloc[start:end], self._keyword_re)
+            for start, end in zip(bounds[:-1], bounds[1:])
+        )
+        # 分片按原顺序拼接，行号加上分片起点还原为块内位置
+        for start, shard in zip(bounds[:-1], shard_results):
+            shard['row'] += start
+        return pd.concat(shard_results, ignore_index=True)
+    
+    def _find_keywords(self, text):
+        """返回text中各meme关键词的完整单词命中次数
+        
+        Hyperscan的\\b按ASCII判断单词边界，只会比re多报（关键词紧挨非ASCII字母时），
+        不会漏报：没有命中或全ASCII文本直接采用Hyperscan结果，其余情况用re复核。
+        """
+        if self._keyword_db is not None:
+            hits = Counter()
+            self._keyword_db.scan(text.encode('utf-8'), match_event_handler=_count_hit, context=hits)
+            if not hits:
+                return hits
+            if text.isascii():
+                return Counter({self._keyword_list[expr_id]: count for expr_id, count in hits.items()})
+        
+        return Counter(match.group(1) for match in self._keyword_re.finditer(text))
     
     def _filter_mainstream_projects(self, potential_memes):
         """过滤主流项目"""
@@ -129,12 +406,13 @@ class MemeDetectorV2:
         
         meme_counts = potential_memes['counts']
         meme_contexts = potential_memes['contexts']
+        meme_context_totals = potential_memes['context_totals']
         meme_categories = potential_memes['categories']
         
         filtered_memes = {}
         
         for meme_name, count in meme_counts.items():
-            # 检查是否在黑名单中
+            # 检查是否在黑名单中（关键词表已排除黑名单，这里只作兜底）
             if meme_name.lower() in self.mainstream_blacklist:
                 print(f"过滤主流项目: {meme_name}")
                 continue
@@ -143,7 +421,7 @@ class MemeDetectorV2:
                 'mention_count': count,
                 'contexts': meme_contexts.get(meme_name, []),
                 'categories': list(meme_categories.get(meme_name, [])),
-                'total_contexts': len(meme_contexts.get(meme_name, []))
+                'total_contexts': meme_context_totals[meme_name]
             }
         
         print(f"过滤后剩余 {len(filtered_memes)} 个meme")
@@ -153,56 +431,81 @@ class MemeDetectorV2:
         """计算meme特征分数"""
         print("计算meme特征分数...")
         
-        meme_scores = {}
+        names = list(filtered_memes)
+        stats_list = list(filtered_memes.values())
+        
+        # 各项指标按列展开为数组，整列计算分数
+        mention_counts = np.fromiter((stats['mention_count'] for stats in stats_list), dtype=np.int64, count=len(stats_list))
+        category_counts = np.fromiter((len(stats['categories']) for stats in stats_list), dtype=np.int64, count=len(stats_list))
+        context_counts = np.fromiter((stats['total_contexts'] for stats in stats_list), dtype=np.int64, count=len(stats_list))
+        
+        # 1. 基础分数：提及次数，最高50分
+        base_scores = np.minimum(mention_counts / 10, 50)
+        # 2. 类别多样性分数：越多类别分数越高，最高20分
+        diversity_scores = np.minimum(category_counts * 10, 20)
+        # 3. 上下文丰富度分数，最高15分
+        context_scores = np.minimum(context_counts / 5, 15)
+        # 4. Meme特征加成
+        meme_bonuses = np.fromiter(
+            (self._keyword_bonus[meme_name] for meme_name in names), dtype=np.int64, count=len(names)
+        )
+        total_scores = base_scores + diversity_scores + context_scores + meme_bonuses
         
-        for meme_name, stats in filtered_memes.items():
-            score = 0
-            
-            # 1. 基础分数：提及次数
-            base_score = min(stats['mention_count'] / 10, 50)  # 最高50分
-            score += base_score
-            
-            # 2. 类别多样性分数：越多类别分数越高
-            category_diversity = len(stats['categories'])
-            diversity_score = min(category_diversity * 10, 20)  # 最高20分
-            score += diversity_score
-            
-            # 3. 上下文丰富度分数
-            context_richness = min(stats['total_contexts'] / 5, 15)  # 最高15分
-            score += context_richness
-            
-            # 4. Meme特征加成
-            meme_bonus = self._calculate_meme_bonus(meme_name, stats)
-            score += meme_bonus
-            
+        meme_scores = {}
+        for meme_name, stats, total, base, diversity, context, bonus in zip(
+            names, stats_list, total_scores.tolist(), base_scores.tolist(),
+            diversity_scores.tolist(), context_scores.tolist(), meme_bonuses.tolist()
+        ):
             meme_scores[meme_name] = {
                 **stats,
-                'total_score': round(score, 2),
-                'base_score': round(base_score, 2),
-                'diversity_score': diversity_score,
-                'context_score': round(context_richness, 2),
-                'meme_bonus': round(meme_bonus, 2)
+                'total_score': round(total, 2),
+                'base_score': round(base, 2),
+                'diversity_score': diversity,
+                'context_score': round(context, 2),
+                'meme_bonus': round(bonus, 2)
             }
         
         return meme_scores
     
+    @staticmethod
+    def _build_bonus_automaton(bonus_keywords):
+        """构建加成关键词的Aho-Corasick自动机，命中时返回所属类别编号"""
+        if ahocorasick is None:
+            return None
+        
+        automaton = ahocorasick.Automaton()
+        for class_id, keywords in enumerate(bonus_keywords):
+            for keyword in keywords:
+                automaton.add_word(keyword, class_id)
+        automaton.make_automaton()
+        return automaton
+    
+    def _bonus_classes(self, meme_lower):
+        """返回名称中（按子串）命中的加成关键词类别编号集合"""
+        if self._bonus_automaton is not None:
+            return {class_id for _, class_id in self._bonus_automaton.iter(meme_lower)}
+        return {
+            class_id for class_id, keywords in enumerate(self._bonus_keywords)
+            if any(keyword in meme_lower for keyword in keywords)
+        }
+    
     def _calculate_meme_bonus(self, meme_name, stats):
         """计算meme特征加成"""
         bonus = 0
-        meme_lower = meme_name.lower()
+        classes = self._bonus_classes(meme_name.lower())
         
         # 动物名称加成
-        if any(animal in meme_lower for animal in ['doge', 'shib', 'pepe', 'floki', 'bonk']):
+        if 0 in classes:
             bonus += 25  # 经典meme币
-        elif any(animal in meme_lower for animal in ['cat', 'dog', 'monkey', 'ape', 'frog']):
+        elif 1 in classes:
             bonus += 15  # 动物名称
         
         # 网络文化加成
-        if any(culture in meme_lower for culture in ['wojak', 'chad', 'virgin', 'simp', 'incel']):
+        if 2 in classes:
             bonus += 20  # 网络文化词汇
         
         # 表情包符号加成
-        if any(emoji in meme_lower for emoji in ['moon', 'rocket', 'fire', 'based', 'cringe']):
+        if 3 in classes:
             bonus += 10  # 表情包元素
         
         return bonus
@@ -211,21 +514,15 @@ class MemeDetectorV2:
         """最终过滤和排序"""
         print("执行最终过滤...")
         
-        # 按总分排序
-        sorted_memes = sorted(
-            meme_scores.items(), 
-            key=lambda x: x[1]['total_score'], 
-            reverse=True
-        )
-        
-        final_memes = {}
+        # 过滤条件：总分太低或提及次数太少；先过滤再排序，只对保留下来的meme排序
+        kept_memes = [
+            (meme_name, stats) for meme_name, stats in meme_scores.items()
+            if stats['total_score'] >= 20 and stats['mention_count'] >= 5
+        ]
         
-        for meme_name, stats in sorted_memes:
-            # 过滤条件：总分太低或提及次数太少
-            if stats['total_score'] < 20 or stats['mention_count'] < 5:
-                continue
-                
-            final_memes[meme_name] = stats
+        # 按总分排序（结果顺序即保存和展示的顺序）
+        kept_memes.sort(key=lambda x: x[1]['total_score'], reverse=True)
+        final_memes = dict(kept_memes)
         
         print(f"最终筛选出 {len(final_memes)} 个高质量meme")
         return final_memes
@@ -239,15 +536,15 @@ class MemeDetectorV2:
         print("\n=== Meme检测结果 V2 ===")
         print(f"检测到的meme数量: {len(self.detected_memes)}")
         
-        # 按总分排序显示前10名
-        sorted_memes = sorted(
-            self.detected_memes.items(), 
-            key=lambda x: x[1]['total_score'], 
-            reverse=True
+        # 按总分取前10名，只维护大小为10的堆
+        top_memes = heapq.nlargest(
+            10,
+            self.detected_memes.items(),
+            key=lambda x: x[1]['total_score']
         )
         
         print("\n=== Top 10 Meme ===")
-        for i, (meme_name, stats) in enumerate(sorted_memes[:10], 1):
+        for i, (meme_name, stats) in enumerate(top_memes, 1):
             categories = ', '.join(stats['categories'])
             print(f"{i}. {meme_name} ({categories})")
             print(f"   总分: {stats['total_score']}, 提及次数: {stats['mention_count']}")
@@ -270,18 +567,23 @@ class MemeDetectorV2:
         }
         
         # 提取meme分数和分类信息
-        meme_scores = {}
-        meme_categories = {}
-        
-        for meme_name, stats in self.detected_memes.items():
-            meme_scores[meme_name] = stats['total_score']
-            meme_categories[meme_name] = stats['categories']
-        
-        save_data['meme_scores'] = meme_scores
-        save_data['meme_categories'] = meme_categories
+        save_data['meme_scores'] = {
+            meme_name: stats['total_score'] for meme_name, stats in self.detected_memes.items()
+        }
+        save_data['meme_categories'] = {
+            meme_name: stats['categories'] for meme_name, stats in self.detected_memes.items()
+        }
         
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(save_data, f, ensure_ascii=False, indent=2, default=str)
+        if orjson is not None:
+            with open(filename, 'wb') as f:
+                f.write(orjson.dumps(
+                    save_data,
+                    option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+                    default=str
+                ))
+        else:
+            with open(filename, 'w', encoding='utf-8') as f:
+                json.dump(save_data, f, ensure_ascii=False, indent=2, default=str)
         
         print(f"结果已保存到 {filename}")
 
@@ -5,13 +5,23 @@
 实现从CSV文件读取到实时API采集的平滑切换
 """
 
+import io
 import json
 import logging
+import numpy as np
 import pandas as pd
 import psycopg2
+from psycopg2.extras import execute_values
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 import hashlib
+from itertools import compress
+
+try:
+    import pyarrow
+    import pyarrow.csv
+except ImportError:  # pyarrow为可选依赖，缺失时使用pandas自带的C解析引擎分块读取
+    pyarrow = None
 
 # 配置日志
 logging.basicConfig(
@@ -29,6 +39,10 @@ class DataPipelineIntegrator:
         self.db_config = self.config['database']
         self.db_conn = None
         
+        # meme关键词在初始化时固定为元组，小写形式预先计算
+        self.meme_keywords = tuple(self.config['collection']['meme_keywords'])
+        self._meme_keywords_lower = tuple(keyword.lower() for keyword in self.meme_keywords)
+        
     def _load_config(self, config_file):
         """加载配置文件"""
         try:
@@ -90,10 +104,7 @@ class DataPipelineIntegrator:
         print("  📝 迁移推文数据...")
         
         try:
-            # 读取CSV文件
             from config.paths import TWEETS_FILE
-            tweets_df = pd.read_csv(TWEETS_FILE)
-            print(f"    读取到 {len(tweets_df)} 条推文")
             
             cursor = self.db_conn.cursor()
             
@@ -101,44 +112,55 @@ class DataPipelineIntegrator:
             cursor.execute("DELETE FROM tweets")
             print("    清空现有推文数据")
             
-            # 批量插入数据
-            batch_size = 1000
+            # 只取入库用到的列，CSV中缺失的列用默认值补齐
+            defaults = {
+                'tweet_id': '', 'text': '', 'user_id': '', 'username': '',
+                'created_at': datetime.now(),
+                'retweets': 0, 'likes': 0, 'replies': 0, 'quotes': 0
+            }
+            
+            # 单遍分块读取CSV：每块整列提取meme提及后直接作为一个批次写入数据库
+            total_count = 0
             migrated_count = 0
             
-            for i in range(0, len(tweets_df), batch_size):
-                batch = tweets_df.iloc[i:i+batch_size]
+            string_columns = ['tweet_id', 'text', 'user_id', 'username']
+            reader = self._iter_csv_chunks(TWEETS_FILE, list(defaults), string_columns=string_columns)
+            for chunk in reader:
+                total_count += len(chunk)
+                records = chunk.assign(**{
+                    column: value for column, value in defaults.items() if column not in chunk.columns
+                })[list(defaults)]
+                # 缺失值统一写成空字符串：两种读取方式的缺失值表示不同（<NA>/None/NaN），
+                # 不处理会被str()成不同的占位文本写入数据库
+                records[string_columns] = records[string_columns].fillna('')
                 
-                for _, row in batch.iterrows():
+                # 整列提取meme提及，按位置与行对应
+                chunk_meme_mentions = self._extract_meme_mentions(records['text'])
+                rows = []
+                
+                for meme_mentions, (tweet_id, text, user_id, username, created_at,
+                                    retweets, likes, replies, quotes) in zip(
+                    chunk_meme_mentions, records.itertuples(index=False, name=None)
+                ):
                     try:
-                        # 提取meme提及
-                        meme_mentions = self._extract_meme_mentions(row.get('text', ''))
-                        
                         # 计算互动指标
                         engagement_metrics = {
-                            'likes': int(row.get('likes', 0)),
-                            'retweets': int(row.get('retweets', 0)),
-                            'replies': int(row.get('replies', 0)),
-                            'quotes': int(row.get('quotes', 0))
+                            'likes': int(likes),
+                            'retweets': int(retweets),
+                            'replies': int(replies),
+                            'quotes': int(quotes)
                         }
                         
-                        # 插入数据
-                        cursor.execute("""
-                            INSERT INTO tweets (
-                                tweet_id, text, user_id, username, created_at,
-                                retweet_count, like_count, reply_count, quote_count,
-                                hashtags, mentions, meme_mentions, engagement_metrics,
-                                collected_at
-                            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                        """, (
-                            str(row.get('tweet_id', '')),
-                            str(row.get('text', '')),
-                            str(row.get('user_id', '')),
-                            str(row.get('username', '')),
-                            row.get('created_at', datetime.now()),
-                            int(row.get('retweets', 0)),
-                            int(row.get('likes', 0)),
-                            int(row.get('replies', 0)),
-                            int(row.get('quotes', 0)),
+                        rows.append((
+                            str(tweet_id),
+                            str(text),
+                            str(user_id),
+                            str(username),
+                            created_at,
+                            engagement_metrics['retweets'],
+                            engagement_metrics['likes'],
+                            engagement_metrics['replies'],
+                            engagement_metrics['quotes'],
                             [],  # hashtags
                             [],  # mentions
                             meme_mentions,
@@ -146,16 +168,26 @@ class DataPipelineIntegrator:
                             datetime.now()
                         ))
                         
-                        migrated_count += 1
-                        
                     except Exception as e:
                         logger.warning(f"跳过无效推文数据: {e}")
                         continue
                 
+                # 多行INSERT写入整块
+                execute_values(cursor, """
+                    INSERT INTO tweets (
+                        tweet_id, text, user_id, username, created_at,
+                        retweet_count, like_count, reply_count, quote_count,
+                        hashtags, mentions, meme_mentions, engagement_metrics,
+                        collected_at
+                    ) VALUES %s
+                """, rows, page_size=1000)
+                migrated_count += len(rows)
+                
                 # 提交批次
                 self.db_conn.commit()
                 print(f"    已迁移 {migrated_count} 条推文")
             
+            print(f"    读取到 {total_count} 条推文")
             cursor.close()
             return migrated_count
             
@@ -181,34 +213,26 @@ class DataPipelineIntegrator:
             
             # 提取唯一用户
             unique_users = followings_df[['user_id', 'username']].drop_duplicates()
-            migrated_count = 0
-            
-            for _, row in unique_users.iterrows():
-                try:
-                    # 计算KOL分数（简化版）
-                    kol_score = self._calculate_kol_score(row)
-                    kol_tier = self._determine_kol_tier(kol_score)
-                    
-                    cursor.execute("""
-                        INSERT INTO kol_users (
-                            user_id, username, display_name, kol_score, kol_tier,
-                            profile_data, last_updated
-                        ) VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    """, (
-                        str(row.get('user_id', '')),
-                        str(row.get('username', '')),
-                        str(row.get('username', '')),
-                        kol_score,
-                        kol_tier,
-                        json.dumps({'source': 'csv_migration'}),
-                        datetime.now()
-                    ))
-                    
-                    migrated_count += 1
-                    
-                except Exception as e:
-                    logger.warning(f"跳过无效用户数据: {e}")
-                    continue
+            user_ids = unique_users['user_id'].astype(str)
+            usernames = unique_users['username'].astype(str)
+            
+            # 整列计算KOL分数和级别（简化版）
+            kol_scores = self._calculate_kol_scores(usernames)
+            kol_tiers = self._determine_kol_tiers(kol_scores)
+            
+            users = pd.DataFrame({
+                'user_id': user_ids,
+                'username': usernames,
+                'display_name': usernames,
+                'kol_score': kol_scores,
+                'kol_tier': kol_tiers,
+                'profile_data': json.dumps({'source': 'csv_migration'}),
+                'last_updated': datetime.now()
+            })
+            
+            # 整表重新装载，用COPY一次写入全部用户
+            self._copy_dataframe(cursor, 'kol_users', users)
+            migrated_count = len(users)
             
             self.db_conn.commit()
             cursor.close()
@@ -237,35 +261,41 @@ class DataPipelineIntegrator:
             kol_profiles = kol_data['kol_profiles']
             print(f"    读取到 {len(kol_profiles)} 个KOL档案")
             
-            cursor = self.db_conn.cursor()
-            migrated_count = 0
-            
+            # 整理待更新的档案，同一用户出现多次时以最后一条为准
+            updates = {}
+            now = datetime.now()
             for profile in kol_profiles:
                 try:
                     user_id = profile.get('user_id', '')
                     if not user_id:
                         continue
                     
-                    # 更新现有用户记录
-                    cursor.execute("""
-                        UPDATE kol_users 
-                        SET kol_score = %s, kol_tier = %s, profile_data = %s, last_updated = %s
-                        WHERE user_id = %s
-                    """, (
+                    updates[str(user_id)] = (
                         float(profile.get('kol_score', 0)),
                         str(profile.get('kol_tier', 'Tier 4')),
                         json.dumps(profile),
-                        datetime.now(),
-                        str(user_id)
-                    ))
-                    
-                    if cursor.rowcount > 0:
-                        migrated_count += 1
+                        now
+                    )
                     
                 except Exception as e:
                     logger.warning(f"跳过无效KOL档案: {e}")
                     continue
             
+            cursor = self.db_conn.cursor()
+            
+            # 全部档案拼成一个VALUES列表，用一条UPDATE ... FROM关联更新现有用户记录，
+            # 不再需要临时表；RETURNING跨分页汇总实际更新的用户
+            rows = [(user_id, *values) for user_id, values in updates.items()]
+            updated = execute_values(cursor, """
+                UPDATE kol_users AS k
+                SET kol_score = v.kol_score, kol_tier = v.kol_tier,
+                    profile_data = v.profile_data, last_updated = v.last_updated
+                FROM (VALUES %s) AS v(user_id, kol_score, kol_tier, profile_data, last_updated)
+                WHERE k.user_id = v.user_id
+                RETURNING k.user_id
+            """, rows, template="(%s, %s::float, %s, %s::jsonb, %s::timestamp)", page_size=500, fetch=True)
+            migrated_count = len(updated)
+            
             self.db_conn.commit()
             cursor.close()
             
@@ -276,52 +306,93 @@ class DataPipelineIntegrator:
             logger.error(f"KOL档案迁移失败: {e}")
             return 0
     
-    def _extract_meme_mentions(self, text: str) -> List[str]:
-        """提取推文中的meme提及"""
-        if not text or pd.isna(text):
-            return []
+    @staticmethod
+    def _iter_csv_chunks(filename, columns, string_columns=(), chunk_size=10000, block_size=16 << 20):
+        """分块读取CSV中存在的指定列，string_columns按字符串读取
         
-        text = str(text).lower()
-        meme_keywords = self.config['collection']['meme_keywords']
+        有pyarrow时用pyarrow.csv按block_size字节流式多线程解析（正文可能跨行），
+        否则使用pandas的C引擎按chunk_size条分块
+        """
+        header = pd.read_csv(filename, nrows=0).columns
+        columns = [column for column in columns if column in header]
         
-        mentions = []
-        for keyword in meme_keywords:
-            if keyword.lower() in text:
-                mentions.append(keyword)
+        if pyarrow is None:
+            yield from pd.read_csv(
+                filename,
+                chunksize=chunk_size,
+                usecols=columns,
+                dtype={column: 'string' for column in string_columns if column in columns}
+            )
+            return
         
-        return mentions
+        reader = pyarrow.csv.open_csv(
+            filename,
+            read_options=pyarrow.csv.ReadOptions(block_size=block_size),
+            parse_options=pyarrow.csv.ParseOptions(newlines_in_values=True),
+            convert_options=pyarrow.csv.ConvertOptions(
+                include_columns=columns,
+                # 流式读取只按首块推断类型，字符串列显式指定
+                column_types={column: pyarrow.string() for column in string_columns if column in columns},
+                # 与pandas一致，空字符串视为缺失值
+                strings_can_be_null=True
+            )
+        )
+        for batch in reader:
+            yield batch.to_pandas()
     
-    def _calculate_kol_score(self, user_data: pd.Series) -> float:
-        """计算KOL分数（简化版）"""
-        # 基于用户名的简单评分
-        username = str(user_data.get('username', '')).lower()
+    @staticmethod
+    def _copy_dataframe(cursor, table: str, df: pd.DataFrame):
+        """用COPY FROM STDIN把DataFrame整体写入表（CSV格式，列名与表字段一一对应）"""
+        buffer = io.StringIO()
+        df.to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(df.columns)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+    
+    def _extract_meme_mentions(self, texts: pd.Series) -> List[List[str]]:
+        """提取整列推文中的meme提及，返回与texts逐行对应的关键词列表"""
+        texts = texts.astype('string').str.lower()
         
-        score = 0.0
+        # 每个关键词对整列做一次C级子串查找，得到 推文 × 关键词 的命中矩阵
+        hits = np.column_stack([
+            texts.str.contains(keyword, regex=False, na=False).to_numpy(dtype=bool)
+            for keyword in self._meme_keywords_lower
+        ]) if self.meme_keywords else np.zeros((len(texts), 0), dtype=bool)
         
-        # 包含特定关键词加分
-        if any(keyword in username for keyword in ['crypto', 'btc', 'eth', 'nft']):
-            score += 30
-        elif any(keyword in username for keyword in ['tech', 'ai', 'startup']):
-            score += 25
-        elif any(keyword in username for keyword in ['trading', 'finance']):
-            score += 20
+        # 按关键词的配置顺序取出每条推文命中的关键词
+        return [list(compress(self.meme_keywords, row)) for row in hits.tolist()]
+    
+    def _calculate_kol_scores(self, usernames: pd.Series) -> pd.Series:
+        """整列计算KOL分数（简化版）"""
+        # 基于用户名的简单评分
+        usernames = usernames.str.lower()
+        
+        # 包含特定关键词加分，按优先级取第一个命中的类别
+        score = np.select(
+            [
+                usernames.str.contains('crypto|btc|eth|nft', regex=True).to_numpy(dtype=bool),
+                usernames.str.contains('tech|ai|startup', regex=True).to_numpy(dtype=bool),
+                usernames.str.contains('trading|finance', regex=True).to_numpy(dtype=bool)
+            ],
+            [30.0, 25.0, 20.0],
+            default=0.0
+        )
         
         # 用户名长度加分（较长的用户名可能更专业）
-        if len(username) > 10:
-            score += 10
+        score += np.where(usernames.str.len().to_numpy() > 10, 10, 0)
         
-        return min(score, 100.0)  # 最高100分
+        return pd.Series(np.minimum(score, 100.0), index=usernames.index)  # 最高100分
     
-    def _determine_kol_tier(self, score: float) -> str:
+    def _determine_kol_tiers(self, scores: pd.Series) -> pd.Series:
         """根据分数确定KOL级别"""
-        if score >= 80:
-            return 'Tier 1'
-        elif score >= 60:
-            return 'Tier 2'
-        elif score >= 40:
-            return 'Tier 3'
-        else:
-            return 'Tier 4'
+        return pd.cut(
+            scores,
+            bins=[-np.inf, 40, 60, 80, np.inf],
+            labels=['Tier 4', 'Tier 3', 'Tier 2', 'Tier 1'],
+            right=False
+        ).astype(str)
     
     def verify_migration(self):
         """验证数据迁移结果"""
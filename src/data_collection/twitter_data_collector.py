@@ -9,27 +9,92 @@ import os
 import json
 import time
 import logging
-import psycopg2
+import logging.handlers
+import queue
+import atexit
+from psycopg2.pool import ThreadedConnectionPool
+from psycopg2.extras import execute_values, Json
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Tuple
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed
 import requests
-from dataclasses import dataclass, asdict
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dataclasses import dataclass
+from operator import attrgetter
+from contextlib import contextmanager
 import hashlib
+import re
+import weakref
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('twitter_collector.log'),
-        logging.StreamHandler()
-    ]
-)
+try:
+    from pybloom_live import ScalableBloomFilter
+except ImportError:  # pybloom-live为可选依赖，缺失时不做预过滤，去重全部交给数据库
+    ScalableBloomFilter = None
+
+try:
+    import httpx
+    import h2  # noqa: F401  httpx的HTTP/2支持依赖h2
+except ImportError:  # httpx[http2]为可选依赖，缺失时使用requests（HTTP/1.1连接池）
+    httpx = None
+
+try:
+    import orjson
+except ImportError:  # orjson为可选依赖，缺失时使用标准库json
+    orjson = None
+
+try:
+    import hyperscan
+except ImportError:  # hyperscan为可选依赖（需要Intel Hyperscan库），缺失时使用合并正则匹配
+    hyperscan = None
+
+try:
+    import ciso8601
+except ImportError:  # ciso8601为可选依赖，缺失时使用datetime.fromisoformat
+    ciso8601 = None
+
+try:
+    import blake3
+except ImportError:  # blake3为可选依赖，缺失时使用hashlib.sha256（OpenSSL实现，支持SHA-NI）
+    blake3 = None
+
+# 配置日志：采集线程只把日志记录放进队列，由后台监听线程写文件和控制台，
+# 热路径上不再有同步的write/flush
+_log_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+_log_handlers = [
+    logging.FileHandler('twitter_collector.log', delay=True),
+    logging.StreamHandler()
+]
+for _handler in _log_handlers:
+    _handler.setFormatter(_log_formatter)
+_log_queue = queue.SimpleQueue()
+_queue_handler = logging.handlers.QueueHandler(_log_queue)
+# QueueHandler入队前已格式化一次消息，这里只保留原文，避免被basicConfig的格式重复包装
+_queue_handler.setFormatter(logging.Formatter('%(message)s'))
+logging.basicConfig(level=logging.INFO, handlers=[_queue_handler])
+_log_listener = logging.handlers.QueueListener(_log_queue, *_log_handlers)
+_log_listener.start()
+# 退出时停止监听线程，确保队列中剩余的日志全部写出
+atexit.register(_log_listener.stop)
 logger = logging.getLogger(__name__)
 
-@dataclass
+def _json_dumps(obj, indent: bool = False) -> str:
+    """序列化为JSON字符串（非ASCII字符原样输出）；有orjson时使用orjson"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode()
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None)
+
+@dataclass(frozen=True)
 class TweetData:
     """推文数据结构"""
+    __slots__ = (
+        'tweet_id', 'text', 'user_id', 'username', 'created_at',
+        'retweet_count', 'like_count', 'reply_count', 'quote_count',
+        'is_retweet', 'is_quote', 'hashtags', 'mentions', 'urls',
+        'media_urls', 'language', 'collected_at'
+    )
+    
     tweet_id: str
     text: str
     user_id: str
@@ -48,9 +113,16 @@ class TweetData:
     language: str
     collected_at: str
 
-@dataclass
+@dataclass(frozen=True)
 class UserData:
     """用户数据结构"""
+    __slots__ = (
+        'user_id', 'username', 'display_name', 'description',
+        'followers_count', 'following_count', 'tweet_count', 'verified',
+        'created_at', 'profile_image_url', 'is_kol', 'kol_score', 'kol_tier',
+        'collected_at'
+    )
+    
     user_id: str
     username: str
     display_name: str
@@ -66,21 +138,168 @@ class UserData:
     kol_tier: str
     collected_at: str
 
+# tweets表中按原样写入的推文字段（与INSERT的列顺序一致，created_at解析后插在两组之间）；
+# username随推文一起保存：用户信息获取失败或非KOL用户被清理后，推文仍保留作者用户名
+_TWEET_ID_FIELDS = attrgetter('tweet_id', 'text', 'user_id', 'username')
+_TWEET_COUNT_FIELDS = attrgetter(
+    'retweet_count', 'like_count', 'reply_count', 'quote_count',
+    'is_retweet', 'is_quote'
+)
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """把ISO 8601时间字符串解析为datetime，直接以时间类型绑定参数，省去数据库端的字符串解析"""
+    if not value:
+        return None
+    if ciso8601 is not None:
+        return ciso8601.parse_datetime(value)
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+class TokenBucket:
+    """线程安全的令牌桶限速器：window秒内最多capacity次请求，令牌匀速补充"""
+    
+    def __init__(self, capacity: int, window: float):
+        self.capacity = capacity
+        self.rate = capacity / window
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """取一个令牌，桶空时阻塞到下一个令牌补充"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class MemeKeywordMatcher:
+    """meme关键词匹配器：全部关键词编译成一个自动机，每条推文只扫描一遍（不区分大小写的子串匹配）"""
+    
+    def __init__(self, keywords: List[str]):
+        self.keywords = tuple(keywords)
+        # 关键词在配置中的顺序，mentions()按此顺序输出
+        self.rank = {keyword: i for i, keyword in enumerate(self.keywords)}
+        self.db = None
+        self.regex = None
+        if not self.keywords:
+            return
+        if hyperscan is not None:
+            # 非字母数字字节按\\xHH转义，关键词按字面量匹配
+            expressions = [
+                b''.join(
+                    bytes([c]) if chr(c).isalnum() and c < 128 else b'\\x%02x' % c
+                    for c in keyword.encode('utf-8')
+                )
+                for keyword in self.keywords
+            ]
+            self.db = hyperscan.Database()
+            self.db.compile(
+                expressions=expressions,
+                ids=list(range(len(expressions))),
+                elements=len(expressions),
+                flags=[hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH] * len(expressions)
+            )
+            # Hyperscan的scratch不能被多个线程同时使用，每个采集线程各分配一个
+            self._local = threading.local()
+        else:
+            # 合并正则只用来快速排除不含任何关键词的推文
+            self.regex = re.compile('|'.join(map(re.escape, self.keywords)), re.IGNORECASE)
+            self._lowered = [(keyword, keyword.lower()) for keyword in self.keywords]
+    
+    def match(self, text: str) -> set:
+        """返回推文中出现的关键词集合"""
+        if self.db is not None:
+            scratch = getattr(self._local, 'scratch', None)
+            if scratch is None:
+                scratch = self._local.scratch = hyperscan.Scratch(self.db)
+            hits = set()
+            self.db.scan(
+                text.encode('utf-8'), match_event_handler=lambda expr_id, start, end, flags, ctx: ctx.add(expr_id),
+                context=hits, scratch=scratch
+            )
+            return {self.keywords[expr_id] for expr_id in hits}
+        if self.regex is not None:
+            # 正则匹配不重叠（"pumpkin"只会匹配出"pump"），命中后再逐个关键词检查，与Hyperscan结果一致
+            if self.regex.search(text) is None:
+                return set()
+            text_lower = text.lower()
+            return {keyword for keyword, lowered in self._lowered if lowered in text_lower}
+        return set()
+    
+    def mentions(self, text: str) -> List[str]:
+        """返回推文中出现的关键词列表（按配置顺序），用于写入meme_mentions列"""
+        return sorted(self.match(text), key=self.rank.__getitem__)
+
 class TwitterDataCollector:
     """Twitter数据采集器"""
     
     def __init__(self, config_file: str = 'collector_config.json'):
         """初始化采集器"""
         self.config = self._load_config(config_file)
-        self.db_conn = None
-        self.session = requests.Session()
+        # 进程内共享的数据库连接池，多个采集线程可以并发写入
+        self.pool = None
+        self.session = self._create_session()
         self.setup_database()
         
+        # 所有采集线程共享API速率限制（默认15分钟450次）
+        api_config = self.config.get('twitter_api', {})
+        self.rate_limiter = TokenBucket(
+            api_config.get('rate_limit', 450), api_config.get('rate_limit_window', 900)
+        )
+        # 并发采集的线程数，不超过连接池上限，避免借不到数据库连接
+        self.max_workers = min(16, self.pool.maxconn)
+        # 后台写线程：队列满时采集线程阻塞等待；攒够推文条数或等满间隔（秒）就写一批
+        self.write_queue_size = 16
+        self.flush_batch_size = 2000
+        self.flush_interval = 0.25
+        # 写线程的批次默认异步提交（不等待WAL落盘）：崩溃时最多丢失最近几批，重新采集即可补回
+        self.synchronous_commit = self.config.get('collection', {}).get('synchronous_commit', False)
+        # 已经PREPARE过热点语句的连接；连接被连接池丢弃后自动移出
+        self._prepared_conns = weakref.WeakSet()
+        
+        # 已入库推文哈希的布隆过滤器，保存前用来筛出可能重复的推文
+        self._seen_lock = threading.Lock()
+        self._seen_hashes = self._load_seen_hashes()
+        
+        # 按配置的meme关键词标记采集到的推文（写入meme_mentions列）
+        self.meme_matcher = MemeKeywordMatcher(self.config.get('collection', {}).get('meme_keywords', []))
+    
+    def _create_session(self):
+        """创建复用连接的HTTP会话
+        
+        有httpx时使用HTTP/2客户端，并发请求复用同一条TLS连接的多个流（连接失败时重试）；
+        否则使用requests会话，对限流和网关错误自动退避重试
+        """
+        retry_attempts = self.config.get('twitter_api', {}).get('retry_attempts', 3)
+        if httpx is not None:
+            transport = httpx.HTTPTransport(
+                http2=True,
+                retries=retry_attempts,
+                limits=httpx.Limits(max_keepalive_connections=16, max_connections=32)
+            )
+            return httpx.Client(transport=transport, timeout=httpx.Timeout(10.0, connect=5.0))
+        
+        session = requests.Session()
+        retry = Retry(
+            total=retry_attempts,
+            backoff_factor=0.5,
+            status_forcelist=[429, 502, 503, 504]
+        )
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=retry)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+        
     def _load_config(self, config_file: str) -> Dict:
         """加载配置文件"""
         if os.path.exists(config_file):
             with open(config_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+                return orjson.loads(f.read()) if orjson is not None else json.load(f)
         else:
             # 默认配置
             default_config = {
@@ -106,24 +325,42 @@ class TwitterDataCollector:
                 }
             }
             with open(config_file, 'w', encoding='utf-8') as f:
-                json.dump(default_config, f, indent=2, ensure_ascii=False)
+                f.write(_json_dumps(default_config, indent=True))
             logger.info(f"已创建默认配置文件: {config_file}")
             return default_config
     
     def setup_database(self):
         """设置PostgreSQL数据库"""
         try:
-            self.db_conn = psycopg2.connect(**self.config['database'])
+            # 连接池大小取自配置（pool_size + max_overflow），其余键作为连接参数
+            db_config = dict(self.config['database'])
+            db_config.pop('type', None)
+            pool_size = db_config.pop('pool_size', 2)
+            max_overflow = db_config.pop('max_overflow', 14)
+            self.pool = ThreadedConnectionPool(pool_size, pool_size + max_overflow, **db_config)
             self._create_tables()
             logger.info("数据库连接成功")
         except Exception as e:
             logger.error(f"数据库连接失败: {e}")
             raise
     
+    @contextmanager
+    def _conn(self):
+        """从连接池借出一个连接，出错时回滚，用完归还"""
+        conn = self.pool.getconn()
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn)
+    
     def _create_tables(self):
         """创建数据表"""
-        with self.db_conn.cursor() as cursor:
+        with self._conn() as conn, conn.cursor() as cursor:
             # 创建推文表
+            # tweet_id/user_id保持VARCHAR：采集目标里有"user_001"这类非数字ID，模拟推文ID也带下划线
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS tweets (
                     id SERIAL PRIMARY KEY,
@@ -131,7 +368,7 @@ class TwitterDataCollector:
                     text TEXT NOT NULL,
                     user_id VARCHAR(50) NOT NULL,
                     username VARCHAR(100) NOT NULL,
-                    created_at TIMESTAMP NOT NULL,
+                    created_at TIMESTAMPTZ NOT NULL,
                     retweet_count INTEGER DEFAULT 0,
                     like_count INTEGER DEFAULT 0,
                     reply_count INTEGER DEFAULT 0,
@@ -144,7 +381,8 @@ class TwitterDataCollector:
                     media_urls JSONB,
                     language VARCHAR(10),
                     collected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    data_hash VARCHAR(64) UNIQUE
+                    data_hash VARCHAR(64) UNIQUE,
+                    meme_mentions TEXT[]
                 )
             """)
             
@@ -160,7 +398,7 @@ class TwitterDataCollector:
                     following_count INTEGER DEFAULT 0,
                     tweet_count INTEGER DEFAULT 0,
                     verified BOOLEAN DEFAULT FALSE,
-                    created_at TIMESTAMP,
+                    created_at TIMESTAMPTZ,
                     profile_image_url TEXT,
                     is_kol BOOLEAN DEFAULT FALSE,
                     kol_score FLOAT DEFAULT 0.0,
@@ -169,79 +407,183 @@ class TwitterDataCollector:
                 )
             """)
             
+            # 旧表的created_at是不带时区的TIMESTAMP，迁移为TIMESTAMPTZ（已迁移时不重写表）
+            cursor.execute("""
+                DO $$
+                DECLARE
+                    tbl TEXT;
+                BEGIN
+                    FOREACH tbl IN ARRAY ARRAY['tweets', 'users'] LOOP
+                        IF EXISTS (
+                            SELECT 1 FROM information_schema.columns
+                            WHERE table_name = tbl AND column_name = 'created_at'
+                              AND data_type = 'timestamp without time zone'
+                        ) THEN
+                            EXECUTE format('ALTER TABLE %I ALTER COLUMN created_at TYPE TIMESTAMPTZ', tbl);
+                        END IF;
+                    END LOOP;
+                END $$
+            """)
+            
             # 创建索引
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_tweets_user_id ON tweets(user_id)")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_tweets_created_at ON tweets(created_at)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_tweets_collected_at ON tweets(collected_at)")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_tweets_hashtags ON tweets USING GIN(hashtags)")
+            # 兼容没有meme_mentions列的旧表
+            cursor.execute("ALTER TABLE tweets ADD COLUMN IF NOT EXISTS meme_mentions TEXT[]")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_tweets_meme_mentions ON tweets USING GIN(meme_mentions)")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_kol ON users(is_kol)")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_kol_score ON users(kol_score)")
+            # 只覆盖可清理的非KOL用户，供cleanup_old_data按collected_at范围扫描
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_users_cleanup ON users(collected_at) WHERE is_kol = FALSE"
+            )
             
-            self.db_conn.commit()
+            conn.commit()
             logger.info("数据库表创建完成")
     
     def collect_kol_tweets(self, kol_users: List[str]) -> Tuple[int, int]:
-        """采集KOL推文数据"""
+        """采集KOL推文数据
+        
+        每个用户的采集相互独立，用线程池并发执行；请求速率由共享的令牌桶控制。
+        采集线程只请求API，数据库写入交给后台写线程合批提交
+        """
         logger.info(f"开始采集KOL推文，目标用户数: {len(kol_users)}")
         
-        total_tweets = 0
         total_users = 0
+        write_queue = queue.Queue(maxsize=self.write_queue_size)
+        # 整轮采集共用一个采集时间，不在每条推文上重复取当前时间
+        now = datetime.now()
         
-        for user_id in kol_users:
+        with ThreadPoolExecutor(max_workers=1) as writer_pool:
+            writer = writer_pool.submit(self._flush_loop, write_queue)
             try:
-                tweets = self._fetch_user_tweets(user_id)
-                if tweets:
-                    saved_count = self._save_tweets(tweets)
-                    total_tweets += saved_count
-                    logger.info(f"用户 {user_id} 采集到 {len(tweets)} 条推文，保存 {saved_count} 条")
-                
-                # 更新用户信息
-                user_info = self._fetch_user_info(user_id)
-                if user_info:
-                    self._save_user(user_info)
-                    total_users += 1
-                
-                # 速率限制控制
-                time.sleep(1)
-                
-            except Exception as e:
-                logger.error(f"采集用户 {user_id} 数据失败: {e}")
-                continue
+                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    futures = {
+                        executor.submit(self._collect_one_user, user_id, write_queue, writer, now): user_id
+                        for user_id in kol_users
+                    }
+                    for future in as_completed(futures):
+                        user_id = futures[future]
+                        try:
+                            total_users += future.result()
+                        except Exception as e:
+                            logger.error(f"采集用户 {user_id} 数据失败: {e}")
+                        if writer.done():
+                            # 写线程已退出，剩余用户采集了也无法入库
+                            for pending in futures:
+                                pending.cancel()
+            finally:
+                # 结束标记：写线程写完队列中剩余的数据后退出
+                try:
+                    self._enqueue(write_queue, None, writer)
+                except RuntimeError:
+                    pass  # 写线程已退出，下面的writer.result()会抛出它的异常
+            total_tweets = writer.result()
         
         logger.info(f"KOL推文采集完成，总计: {total_tweets} 条推文，{total_users} 个用户")
         return total_tweets, total_users
     
-    def _fetch_user_tweets(self, user_id: str) -> List[TweetData]:
+    def _collect_one_user(self, user_id: str, write_queue: queue.Queue, writer: Future, now: datetime) -> int:
+        """采集单个用户的推文和用户信息并放入写队列，返回是否采集到了用户信息"""
+        tweets = self._fetch_user_tweets(user_id, now)
+        user_info = self._fetch_user_info(user_id, now)
+        if not tweets and not user_info:
+            return 0
+        
+        if tweets:
+            logger.info(f"用户 {user_id} 采集到 {len(tweets)} 条推文")
+        self._enqueue(write_queue, (user_info, tweets), writer)
+        return 1 if user_info else 0
+    
+    def _enqueue(self, write_queue: queue.Queue, item, writer: Future):
+        """放入写队列；队列满时等待，但写线程已退出（没有人再取数据）时抛出RuntimeError而不是永久阻塞"""
+        while True:
+            try:
+                write_queue.put(item, timeout=self.flush_interval)
+                return
+            except queue.Full:
+                if writer.done():
+                    raise RuntimeError("后台写线程已退出，无法写入采集数据")
+    
+    def _flush_loop(self, write_queue: queue.Queue) -> int:
+        """后台写线程：合并队列中的多个用户，一批一个事务写入，返回新插入的推文总数
+        
+        攒够flush_batch_size条推文或距本批第一项超过flush_interval秒即写出；收到None时写完剩余数据退出
+        """
+        saved = 0
+        done = False
+        while not done:
+            item = write_queue.get()
+            if item is None:
+                break
+            batch = [item]
+            pending = len(item[1])
+            deadline = time.monotonic() + self.flush_interval
+            while pending < self.flush_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = write_queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    done = True
+                    break
+                batch.append(item)
+                pending += len(item[1])
+            
+            users = [user for user, _ in batch if user is not None]
+            tweets = [tweet for _, user_tweets in batch for tweet in user_tweets]
+            try:
+                saved += self._save_users_and_tweets(users, tweets)
+            except Exception as e:
+                # 单批失败只丢弃这一批，写线程必须继续取队列，否则采集线程会阻塞在put上
+                logger.error(f"写入采集数据失败: {e}")
+        return saved
+    
+    def _fetch_user_tweets(self, user_id: str, now: Optional[datetime] = None) -> List[TweetData]:
         """获取用户推文"""
         try:
+            # 速率限制控制
+            self.rate_limiter.acquire()
             # 这里应该使用Twitter API，现在用模拟数据
             # 实际实现时需要替换为真实的API调用
-            return self._generate_mock_tweets(user_id)
+            return self._generate_mock_tweets(user_id, now)
         except Exception as e:
             logger.error(f"获取用户推文失败: {e}")
             return []
     
-    def _fetch_user_info(self, user_id: str) -> Optional[UserData]:
+    def _fetch_user_info(self, user_id: str, now: Optional[datetime] = None) -> Optional[UserData]:
         """获取用户信息"""
         try:
+            # 速率限制控制
+            self.rate_limiter.acquire()
             # 这里应该使用Twitter API，现在用模拟数据
-            return self._generate_mock_user(user_id)
+            return self._generate_mock_user(user_id, now)
         except Exception as e:
             logger.error(f"获取用户信息失败: {e}")
             return None
     
-    def _generate_mock_tweets(self, user_id: str) -> List[TweetData]:
-        """生成模拟推文数据（用于测试）"""
-        tweets = []
-        base_time = datetime.now() - timedelta(hours=24)
+    def _generate_mock_tweets(self, user_id: str, now: Optional[datetime] = None) -> List[TweetData]:
+        """生成模拟推文数据（用于测试），now为采集时间，缺省取当前时间"""
+        # 时间戳和采集时间每批只取一次，循环内只做加法和格式化
+        now = now or datetime.now()
+        base_time = now - timedelta(hours=24)
+        step = timedelta(hours=4)
+        stamp = int(now.timestamp())
+        collected_at = now.isoformat()
+        username = f"user_{user_id}"
         
-        for i in range(5):  # 每个用户生成5条推文
-            tweet_time = base_time + timedelta(hours=i*4)
-            tweet_data = TweetData(
-                tweet_id=f"{user_id}_{i}_{int(time.time())}",
+        return [  # 每个用户生成5条推文
+            TweetData(
+                tweet_id=f"{user_id}_{i}_{stamp}",
                 text=f"这是用户 {user_id} 的第 {i+1} 条推文 #测试 #meme",
                 user_id=user_id,
-                username=f"user_{user_id}",
-                created_at=tweet_time.isoformat(),
+                username=username,
+                created_at=(base_time + step * i).isoformat(),
                 retweet_count=i,
                 like_count=i*2,
                 reply_count=i//2,
@@ -253,14 +595,13 @@ class TwitterDataCollector:
                 urls=[],
                 media_urls=[],
                 language="zh",
-                collected_at=datetime.now().isoformat()
+                collected_at=collected_at
             )
-            tweets.append(tweet_data)
-        
-        return tweets
+            for i in range(5)
+        ]
     
-    def _generate_mock_user(self, user_id: str) -> UserData:
-        """生成模拟用户数据（用于测试）"""
+    def _generate_mock_user(self, user_id: str, now: Optional[datetime] = None) -> UserData:
+        """生成模拟用户数据（用于测试），now为采集时间，缺省取当前时间"""
         return UserData(
             user_id=user_id,
             username=f"user_{user_id}",
@@ -275,97 +616,192 @@ class TwitterDataCollector:
             is_kol=True,
             kol_score=80.0 + float(user_id) * 2.0,
             kol_tier="Tier 2",
-            collected_at=datetime.now().isoformat()
+            collected_at=(now or datetime.now()).isoformat()
         )
     
-    def _save_tweets(self, tweets: List[TweetData]) -> int:
-        """保存推文到数据库"""
-        saved_count = 0
+    def _load_seen_hashes(self):
+        """用库中已有的data_hash预热布隆过滤器（服务端游标分页读取）"""
+        if ScalableBloomFilter is None:
+            return None
         
-        with self.db_conn.cursor() as cursor:
-            for tweet in tweets:
-                try:
-                    # 生成数据哈希，用于去重
-                    data_hash = self._generate_tweet_hash(tweet)
-                    
-                    cursor.execute("""
-                        INSERT INTO tweets (
-                            tweet_id, text, user_id, username, created_at,
-                            retweet_count, like_count, reply_count, quote_count,
-                            is_retweet, is_quote, hashtags, mentions, urls,
-                            media_urls, language, data_hash
-                        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                        ON CONFLICT (data_hash) DO NOTHING
-                    """, (
-                        tweet.tweet_id, tweet.text, tweet.user_id, tweet.username,
-                        tweet.created_at, tweet.retweet_count, tweet.like_count,
-                        tweet.reply_count, tweet.quote_count, tweet.is_retweet,
-                        tweet.is_quote, json.dumps(tweet.hashtags), json.dumps(tweet.mentions),
-                        json.dumps(tweet.urls), json.dumps(tweet.media_urls),
-                        tweet.language, data_hash
-                    ))
-                    saved_count += 1
-                    
-                except Exception as e:
-                    logger.error(f"保存推文失败: {e}")
-                    continue
+        seen_hashes = ScalableBloomFilter(initial_capacity=1000000, error_rate=1e-4)
+        with self._conn() as conn:
+            with conn.cursor(name='seen_tweet_hashes') as cursor:
+                cursor.itersize = 10000
+                cursor.execute("SELECT data_hash FROM tweets WHERE data_hash IS NOT NULL")
+                for (data_hash,) in cursor:
+                    seen_hashes.add(data_hash)
+            conn.commit()
+        return seen_hashes
+    
+    def _save_users_and_tweets(self, users: List[UserData], tweets: List[TweetData]) -> int:
+        """在一个事务中保存一批用户信息和推文，返回实际新插入的推文条数
         
-        self.db_conn.commit()
-        return saved_count
+        每批只借一次连接、只提交一次；推文写入放在SAVEPOINT中，
+        推文批次出错时回滚到保存点，不影响用户信息的更新。
+        用户upsert和SAVEPOINT拼成一次发送，保存点由COMMIT隐式释放，减少往返次数；
+        未开启synchronous_commit时本事务异步提交。
+        无法解析的推文和用户逐条跳过，不影响同批其他数据
+        """
+        rows = self._build_tweet_rows(tweets)
+        inserted = 0
+        try:
+            with self._conn() as conn, conn.cursor() as cursor:
+                self._prepare_statements(conn, cursor)
+                statements = [] if self.synchronous_commit else [b"SET LOCAL synchronous_commit = off"]
+                for user in users:
+                    try:
+                        statements.append(self._user_upsert_sql(cursor, user))
+                    except Exception as e:
+                        logger.error(f"跳过无效的用户信息 {user.user_id}: {e}")
+                if rows:
+                    statements.append(b"SAVEPOINT save_tweets")
+                if statements:
+                    cursor.execute(b"; ".join(statements))
+                
+                if rows:
+                    try:
+                        inserted = self._insert_tweets(cursor, rows)
+                    except Exception as e:
+                        cursor.execute("ROLLBACK TO SAVEPOINT save_tweets")
+                        logger.error(f"保存推文失败: {e}")
+                        rows = []
+                conn.commit()
+            
+            # 提交成功后再登记哈希（每行最后一列），回滚的批次下次仍会重新写入
+            if self._seen_hashes is not None and rows:
+                with self._seen_lock:
+                    for row in rows:
+                        self._seen_hashes.add(row[-1])
+            return inserted
+            
+        except Exception as e:
+            logger.error(f"保存用户及推文失败: {e}")
+            return 0
     
-    def _save_user(self, user: UserData):
-        """保存用户信息到数据库"""
-        with self.db_conn.cursor() as cursor:
+    def _prepare_statements(self, conn, cursor):
+        """每个连接首次使用时PREPARE热点语句，之后只发送EXECUTE，省去重复的解析和规划
+        
+        预备语句属于会话级别，单独提交一次，后续事务回滚不影响
+        """
+        if conn in self._prepared_conns:
+            return
+        cursor.execute("""
+            PREPARE user_upsert AS
+            INSERT INTO users (
+                user_id, username, display_name, description,
+                followers_count, following_count, tweet_count,
+                verified, created_at, profile_image_url,
+                is_kol, kol_score, kol_tier
+            ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13)
+            ON CONFLICT (user_id) 
+            DO UPDATE SET
+                followers_count = EXCLUDED.followers_count,
+                following_count = EXCLUDED.following_count,
+                tweet_count = EXCLUDED.tweet_count,
+                kol_score = EXCLUDED.kol_score,
+                kol_tier = EXCLUDED.kol_tier,
+                collected_at = CURRENT_TIMESTAMP
+        """)
+        cursor.execute("PREPARE tweet_seen AS SELECT data_hash FROM tweets WHERE data_hash = ANY($1)")
+        conn.commit()
+        self._prepared_conns.add(conn)
+    
+    def _build_tweet_rows(self, tweets: List[TweetData]) -> List[tuple]:
+        """把推文转换成INSERT行（最后一列为data_hash）；在访问数据库之前完成，解析失败的推文记录日志后跳过
+        
+        同时按配置的meme关键词标记推文，命中的关键词写入meme_mentions列
+        """
+        rows = []
+        for tweet in tweets:
             try:
-                cursor.execute("""
-                    INSERT INTO users (
-                        user_id, username, display_name, description,
-                        followers_count, following_count, tweet_count,
-                        verified, created_at, profile_image_url,
-                        is_kol, kol_score, kol_tier
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (user_id) 
-                    DO UPDATE SET
-                        followers_count = EXCLUDED.followers_count,
-                        following_count = EXCLUDED.following_count,
-                        tweet_count = EXCLUDED.tweet_count,
-                        kol_score = EXCLUDED.kol_score,
-                        kol_tier = EXCLUDED.kol_tier,
-                        collected_at = CURRENT_TIMESTAMP
-                """, (
-                    user.user_id, user.username, user.display_name, user.description,
-                    user.followers_count, user.following_count, user.tweet_count,
-                    user.verified, user.created_at, user.profile_image_url,
-                    user.is_kol, user.kol_score, user.kol_tier
-                ))
-                self.db_conn.commit()
-                
-            except Exception as e:
-                logger.error(f"保存用户信息失败: {e}")
+                rows.append(
+                    _TWEET_ID_FIELDS(tweet) + (_parse_timestamp(tweet.created_at),) + _TWEET_COUNT_FIELDS(tweet) + (
+                        Json(tweet.hashtags, dumps=_json_dumps), Json(tweet.mentions, dumps=_json_dumps),
+                        Json(tweet.urls, dumps=_json_dumps), Json(tweet.media_urls, dumps=_json_dumps),
+                        tweet.language, self.meme_matcher.mentions(tweet.text), self._generate_tweet_hash(tweet)
+                    )
+                )
+            except (TypeError, ValueError) as e:
+                logger.error(f"跳过无法解析的推文 {tweet.tweet_id}: {e}")
+        return rows
+    
+    def _insert_tweets(self, cursor, rows: List[tuple]) -> int:
+        """用一条多行INSERT写入整批推文行（不提交），返回实际新插入的条数"""
+        # 布隆过滤器判定为未见过的推文一定是新的；判定为可能重复的只是候选，
+        # 由数据库确认后才跳过，误判不会丢数据
+        candidates = []
+        if self._seen_hashes is not None:
+            with self._seen_lock:
+                candidates = [row[-1] for row in rows if row[-1] in self._seen_hashes]
+        
+        if candidates:
+            cursor.execute("EXECUTE tweet_seen (%s)", (candidates,))
+            existing = {data_hash for (data_hash,) in cursor.fetchall()}
+            # 只保留确认不重复的推文
+            rows = [row for row in rows if row[-1] not in existing]
+        if not rows:
+            return 0
+        
+        # 其余冲突（tweet_id或data_hash重复）直接跳过，RETURNING只返回新插入的行；
+        # 多行INSERT每页只解析规划一次，不需要再PREPARE
+        inserted = execute_values(cursor, """
+            INSERT INTO tweets (
+                tweet_id, text, user_id, username, created_at,
+                retweet_count, like_count, reply_count, quote_count,
+                is_retweet, is_quote, hashtags, mentions, urls,
+                media_urls, language, meme_mentions, data_hash
+            ) VALUES %s
+            ON CONFLICT DO NOTHING
+            RETURNING 1
+        """, rows, page_size=1000, fetch=True)
+        return len(inserted)
+    
+    def _user_upsert_sql(self, cursor, user: UserData) -> bytes:
+        """生成写入或更新用户信息的语句（已绑定参数，由调用方和其他语句一起发送）"""
+        return cursor.mogrify("EXECUTE user_upsert (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)", (
+            user.user_id, user.username, user.display_name, user.description,
+            user.followers_count, user.following_count, user.tweet_count,
+            user.verified, _parse_timestamp(user.created_at), user.profile_image_url,
+            user.is_kol, user.kol_score, user.kol_tier
+        ))
     
     def _generate_tweet_hash(self, tweet: TweetData) -> str:
-        """生成推文数据哈希，用于去重"""
-        content = f"{tweet.tweet_id}_{tweet.text}_{tweet.user_id}_{tweet.created_at}"
-        return hashlib.md5(content.encode()).hexdigest()
+        """生成推文数据哈希，用于去重（64位十六进制，与data_hash列长度一致）
+        
+        哈希在客户端计算而不是用数据库生成列：布隆过滤器预过滤需要在INSERT之前拿到哈希，
+        且created_at::text依赖DateStyle，不满足生成列表达式必须IMMUTABLE的要求
+        """
+        # 字段之间用\x1f分隔，避免不同字段拼接后产生相同内容
+        content = '\x1f'.join((tweet.tweet_id, tweet.text, tweet.user_id, tweet.created_at)).encode()
+        if blake3 is not None:
+            return blake3.blake3(content).hexdigest()
+        return hashlib.sha256(content).hexdigest()
     
     def get_collection_stats(self) -> Dict:
-        """获取采集统计信息"""
-        with self.db_conn.cursor() as cursor:
+        """获取采集统计信息
+        
+        推文和用户总数取自pg_class的估算值（VACUUM/ANALYZE时更新），避免全表COUNT
+        """
+        with self._conn() as conn, conn.cursor() as cursor:
             # 推文统计
-            cursor.execute("SELECT COUNT(*) FROM tweets")
-            total_tweets = cursor.fetchone()[0]
+            total_tweets = self._estimate_count(cursor, "tweets")
             
             # 用户统计
-            cursor.execute("SELECT COUNT(*) FROM users")
-            total_users = cursor.fetchone()[0]
+            total_users = self._estimate_count(cursor, "users")
             
             # KOL统计
             cursor.execute("SELECT COUNT(*) FROM users WHERE is_kol = TRUE")
             total_kols = cursor.fetchone()[0]
             
             # 今日采集统计
+            # 用范围条件代替DATE(collected_at)，才能走idx_tweets_collected_at索引
             today = datetime.now().date()
-            cursor.execute("SELECT COUNT(*) FROM tweets WHERE DATE(collected_at) = %s", (today,))
+            start = datetime.combine(today, datetime.min.time())
+            cursor.execute(
+                "SELECT COUNT(*) FROM tweets WHERE collected_at >= %s AND collected_at < %s",
+                (start, start + timedelta(days=1))
+            )
             today_tweets = cursor.fetchone()[0]
             
             return {
@@ -376,25 +812,58 @@ class TwitterDataCollector:
                 "collection_date": today.isoformat()
             }
     
-    def cleanup_old_data(self, days: int = 30):
-        """清理旧数据"""
+    @staticmethod
+    def _estimate_count(cursor, table: str) -> int:
+        """返回表的估算行数；表还没有统计信息时（PG14+为-1，更早版本为0）退回精确COUNT"""
+        cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", (table,))
+        estimate = cursor.fetchone()[0]
+        if estimate > 0:
+            return estimate
+        cursor.execute(f"SELECT COUNT(*) FROM {table}")
+        return cursor.fetchone()[0]
+    
+    def cleanup_old_data(self, days: int = 30, batch_size: int = 10000):
+        """清理旧数据
+        
+        按batch_size分批删除、每批提交，避免一次锁住大量行、产生大段WAL而阻塞并发写入
+        """
         cutoff_date = datetime.now() - timedelta(days=days)
         
-        with self.db_conn.cursor() as cursor:
-            cursor.execute("DELETE FROM tweets WHERE created_at < %s", (cutoff_date,))
-            deleted_tweets = cursor.rowcount
-            
-            cursor.execute("DELETE FROM users WHERE collected_at < %s AND is_kol = FALSE", (cutoff_date,))
-            deleted_users = cursor.rowcount
-            
-            self.db_conn.commit()
+        with self._conn() as conn, conn.cursor() as cursor:
+            deleted_tweets = self._delete_in_batches(
+                conn, cursor, "tweets", "created_at < %s", (cutoff_date,), batch_size
+            )
+            deleted_users = self._delete_in_batches(
+                conn, cursor, "users", "collected_at < %s AND is_kol = FALSE", (cutoff_date,), batch_size
+            )
             
             logger.info(f"清理完成: 删除 {deleted_tweets} 条旧推文，{deleted_users} 个旧用户")
     
+    @staticmethod
+    def _delete_in_batches(conn, cursor, table: str, condition: str, params: tuple, batch_size: int) -> int:
+        """循环删除table中满足condition的行，每批最多batch_size行并提交，返回删除总数"""
+        # 正被写入线程锁住的行跳过，留给下一轮清理
+        sql = f"""
+            WITH old AS (
+                SELECT ctid FROM {table} WHERE {condition}
+                LIMIT %s FOR UPDATE SKIP LOCKED
+            )
+            DELETE FROM {table} t USING old WHERE t.ctid = old.ctid
+        """
+        total = 0
+        while True:
+            cursor.execute(sql, params + (batch_size,))
+            deleted = cursor.rowcount
+            conn.commit()
+            total += deleted
+            if deleted < batch_size:
+                return total
+    
     def close(self):
-        """关闭数据库连接"""
-        if self.db_conn:
-            self.db_conn.close()
+        """关闭HTTP会话和连接池中的全部数据库连接"""
+        self.session.close()
+        if self.pool:
+            self.pool.closeall()
             logger.info("数据库连接已关闭")
 
 def main():
@@ -411,7 +880,7 @@ def main():
         
         # 获取统计信息
         stats = collector.get_collection_stats()
-        logger.info(f"采集统计: {json.dumps(stats, indent=2, ensure_ascii=False)}")
+        logger.info(f"采集统计: {_json_dumps(stats, indent=True)}")
         
         # 清理旧数据
         collector.cleanup_old_data(days=30)